@@ -1,10 +1,14 @@
+import functools
 import string
 
-from typing import Any, Callable, Union, Tuple
+from contextlib import closing
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Union, Tuple
 
+import openpyxl
 import wx
 
 
+@functools.lru_cache(maxsize=4096)
 def column_label(number: int) -> str:
     assert number > 0, number
     label = []
@@ -15,6 +19,7 @@ def column_label(number: int) -> str:
     return "".join(label[::-1])
 
 
+@functools.lru_cache(maxsize=4096)
 def clone_label(number: int) -> str:
     assert number >= 0
     return string.ascii_uppercase[(number // 12)] + str(number % 12 + 1)
@@ -33,7 +38,16 @@ def wx_bind(key: Union[str, int], event: Any, func: Callable) -> None:
     widget.Bind(event, func)
 
 
+# Widgets previously located by wx_find, by name or ID
+_WX_WIDGETS = {}  # type: Dict[Union[str, int], Any]
+
+
 def wx_find(key: Union[str, int]) -> Any:
+    # Destroyed widgets evaluate to False and are looked up again
+    widget = _WX_WIDGETS.get(key)
+    if widget:
+        return widget
+
     if isinstance(key, str):
         widget = wx.FindWindowByName(key)
     elif isinstance(key, int):
@@ -44,19 +58,73 @@ def wx_find(key: Union[str, int]) -> Any:
     if not widget:
         raise KeyError(f"Could not find widget with key {key!r}")
 
+    _WX_WIDGETS[key] = widget
+
     return widget
 
 
+def wx_set_cell_value(grid: Any, row: int, column: int, value: str) -> None:
+    # Cells are only updated if changed, since every update invalidates the cell
+    if grid.GetCellValue(row, column) != value:
+        grid.SetCellValue(row, column, value)
+
+
+def wx_set_cell_alignment(
+    grid: Any, row: int, column: int, horizontal: int, vertical: int
+) -> None:
+    if grid.GetCellAlignment(row, column) != (horizontal, vertical):
+        grid.SetCellAlignment(row, column, horizontal, vertical)
+
+
+def wx_set_cell_text_colour(grid: Any, row: int, column: int, colour: Any) -> None:
+    if grid.GetCellTextColour(row, column) != colour:
+        grid.SetCellTextColour(row, column, colour)
+
+
+def wx_set_cell_background_colour(
+    grid: Any, row: int, column: int, colour: Any
+) -> None:
+    if grid.GetCellBackgroundColour(row, column) != colour:
+        grid.SetCellBackgroundColour(row, column, colour)
+
+
 def xlsx_strip(value):
     if isinstance(value, str):
-        value = list(value)
-        while value and (value[-1].isspace() or not value[-1].isprintable()):
-            value.pop()
+        # Only the ends are scanned; no copy is made if there is nothing to strip
+        start = 0
+        end = len(value)
+        while start < end:
+            char = value[start]
+            if char.isprintable() and not char.isspace():
+                break
+            start += 1
+
+        while end > start:
+            char = value[end - 1]
+            if char.isprintable() and not char.isspace():
+                break
+            end -= 1
+
+        value = value[start:end]
+
+    return value
 
-        value.reverse()
-        while value and (value[-1].isspace() or not value[-1].isprintable()):
-            value.pop()
 
-        value = "".join(value[::-1])
+def xlsx_open(filename: str) -> ContextManager[Any]:
+    # Read-only mode streams rows instead of loading the whole workbook up front
+    workbook = openpyxl.load_workbook(
+        filename, read_only=True, data_only=True, keep_links=False
+    )
 
-    return value
+    return closing(workbook)
+
+
+def xlsx_read_rows(sheet: Any) -> Iterator[List[Any]]:
+    for row in sheet.iter_rows(values_only=True):
+        # Empty cells are read as None; treat them as empty strings
+        yield [
+            xlsx_strip(value)
+            if isinstance(value, str)
+            else ("" if value is None else value)
+            for value in row
+        ]
@@ -4,7 +4,7 @@ import os
 import sys
 
 from pathlib import Path
-from typing import Any, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 import wx
 import wx.xrc
@@ -35,6 +35,34 @@ class PropGridXMLHandler(wx.xrc.XmlResourceHandler):
         return widget
 
 
+class VirtualListCtrlXMLHandler(wx.xrc.XmlResourceHandler):
+    def __init__(self) -> None:
+        wx.xrc.XmlResourceHandler.__init__(self)
+        for style in ("LC_HRULES", "LC_REPORT", "LC_VRULES"):
+            self.AddStyle("wx" + style, getattr(wx, style))
+        self.AddWindowStyles()
+
+    # ui.xrc is generated from ui.wxg, in which the control is a plain wxListCtrl
+    def CanHandle(self, node):
+        return (
+            self.IsOfClass(node, "wxListCtrl")
+            and node.GetAttribute("name") == "miseq_output"
+        )
+
+    def DoCreateResource(self):
+        assert self.GetInstance() is None
+        widget = ui.VirtualListCtrl(
+            self.GetParentAsWindow(),
+            self.GetID(),
+            self.GetPosition(),
+            self.GetSize(),
+            self.GetStyle() | wx.LC_VIRTUAL,
+        )
+        widget.SetName(self.GetName())
+        self.SetupWindow(widget)
+        return widget
+
+
 class MyApp(wx.App):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         wx.App.__init__(self, *args, **kwargs)
@@ -42,6 +70,8 @@ class MyApp(wx.App):
     def OnInit(self) -> bool:
         resources = wx.xrc.XmlResource()
         resources.AddHandler(PropGridXMLHandler())
+        # Inserted before the built-in wxListCtrl handler, which would otherwise be used
+        resources.InsertHandler(VirtualListCtrlXMLHandler())
 
         xrc_filepath = os.path.join(os.path.dirname(__file__), "ui.xrc")
         resources.Load(xrc_filepath)
@@ -53,6 +83,7 @@ class MyApp(wx.App):
         self.state = state.State()
         self.undo_buttons = []  # type: List[Any]
         self.redo_buttons = []  # type: List[Any]
+        self._button_states = {}  # type: Dict[int, Tuple[bool, str]]
         self.samplesheet = ui.SampleSheetWidget(self, self.state)
         self.ko_mapping = ui.KOMappingWidget(self, self.state)
         self.miseq_output = ui.MiSeqOutputWidget(self, self.state)
@@ -105,9 +136,15 @@ class MyApp(wx.App):
         )
 
         for text, widgets, count in history_buttons:
+            button_state = (bool(count), f"{text} ({count})" if count else text)
+
             for widget in widgets:
-                widget.Enable(bool(count))
-                widget.SetLabel(f"{text} ({count})" if count else text)
+                # SetLabel triggers a re-layout, even if the label is unchanged
+                if self._button_states.get(id(widget)) != button_state:
+                    self._button_states[id(widget)] = button_state
+
+                    widget.Enable(button_state[0])
+                    widget.SetLabel(button_state[1])
 
     def load_miseq_output(self) -> None:
         with wx.FileDialog(
@@ -1,8 +1,10 @@
+import contextlib
+import os
 import pickle
 
 import openpyxl
 
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 from mypy_extensions import TypedDict
 
 import state.samplesheet as samplesheet
@@ -11,23 +13,34 @@ import state.miseq as miseq
 from common import label_to_key
 
 
-_Snapshot = TypedDict(
+# Snapshots are immutable; the objects they contain are replaced, never modified
+_Snapshot = NamedTuple(
     "_Snapshot",
-    {
-        "samplesheet": samplesheet.SampleSheet,
-        "miseq": miseq.MiSeqOutput,
-        "ko_mapping": Dict[str, Optional[str]],
-        "default_ko_mapping": Dict[str, Optional[str]],
-    },
+    [
+        ("samplesheet", samplesheet.SampleSheet),
+        ("miseq", miseq.MiSeqOutput),
+        ("ko_mapping", Dict[str, Optional[str]]),
+        ("default_ko_mapping", Dict[str, Optional[str]]),
+    ],
 )
 
 
 _SnapshotList = List[_Snapshot]
 
+# Protocol 4 is the fastest protocol that can be read by all supported versions of
+# Python; protocol 5 only adds out-of-band buffers, which are not used here
+PICKLE_PROTOCOL = 4
+
 
 KOMapping = Dict[str, Optional[str]]
 
 
+_GroupingCache = Optional[Tuple[samplesheet.SampleSheet, samplesheet.GroupedKnockouts]]
+_InverseMappingCache = Optional[Tuple[KOMapping, Dict[str, str]]]
+_TargetNamesCache = Optional[Tuple[Any, List[str]]]
+_ColumnsCache = Optional[Tuple[samplesheet.SampleSheet, samplesheet.KnockoutColumns]]
+
+
 Clone = TypedDict(
     "Clone",
     {
@@ -55,6 +68,11 @@ class State:
         self._undo_history = []  # type: _SnapshotList
         self._redo_history = []  # type: _SnapshotList
         self._saved_state = self._store_state()  # type: _Snapshot
+        self._grouped_knockouts_cache = None  # type: _GroupingCache
+        self._inverse_ko_mapping_cache = None  # type: _InverseMappingCache
+        self._ss_target_names_cache = None  # type: _TargetNamesCache
+        self._miseq_target_names_cache = None  # type: _TargetNamesCache
+        self._ss_columns_cache = None  # type: _ColumnsCache
 
     def undo(self) -> None:
         if self._undo_history:
@@ -80,24 +98,36 @@ class State:
         self._append_undo_history(state)
 
     def samplesheet_group_by(self, key: str) -> None:
+        if key == self.samplesheet["group_by"]:
+            return
+
         state = self._store_state()
         self.samplesheet = samplesheet.group_by(self.samplesheet, key)
         self._append_undo_history(state)
 
     def samplesheet_target_names(self) -> List[str]:
-        return sorted(
-            {
+        cache = self._ss_target_names_cache
+        if cache is None or cache[0] is not self.samplesheet:
+            target_names = {
                 knockout["headers"]["knockout"]
                 for knockout in self.samplesheet["knockouts"]
             }
-        )
+
+            cache = (self.samplesheet, sorted(target_names))
+            self._ss_target_names_cache = cache
+
+        return cache[1]
 
     def samplesheet_column(self, knockout: str) -> List[Optional[str]]:
-        for key, value in self.ko_mapping.items():
-            if value == knockout:
-                return samplesheet.get_column_for_ko(self.samplesheet, key)
+        key = self._inverse_ko_mapping().get(knockout)
+        if key is None:
+            return []
 
-        return []
+        column = self._samplesheet_columns().get(key)
+        if column is None:
+            return samplesheet.get_column_for_ko(self.samplesheet, key)
+
+        return column
 
     def miseq_load(self, filename: str) -> None:
         state = self._store_state()
@@ -106,7 +136,12 @@ class State:
         self._append_undo_history(state)
 
     def miseq_target_names(self) -> List[str]:
-        return sorted(self.miseq)
+        cache = self._miseq_target_names_cache
+        if cache is None or cache[0] is not self.miseq:
+            cache = (self.miseq, sorted(self.miseq))
+            self._miseq_target_names_cache = cache
+
+        return cache[1]
 
     def miseq_toggle_picked(self, target: str, index: int) -> None:
         state = self._store_state()
@@ -116,18 +151,20 @@ class State:
     def miseq_toggle_all(self, clone: Clone) -> None:
         state = self._store_state()
 
-        any_picked = False
-        for ko in clone["knockouts"].values():
-            if ko is not None:
-                any_picked |= miseq.is_picked(self.miseq, ko["target"], ko["index"])
+        results = [
+            (ko["target"], ko["index"])
+            for ko in clone["knockouts"].values()
+            if ko is not None
+        ]
 
-        for ko in clone["knockouts"].values():
-            if ko is not None:
-                self.miseq = miseq.set_picked(
-                    self.miseq, ko["target"], ko["index"], not any_picked
-                )
+        any_picked = any(
+            miseq.is_picked(self.miseq, target, index) for target, index in results
+        )
 
-        self._append_undo_history(state)
+        new_miseq = miseq.set_picked_many(self.miseq, results, not any_picked)
+        if new_miseq is not self.miseq:
+            self.miseq = new_miseq
+            self._append_undo_history(state)
 
     def miseq_set_comment(self, target: str, index: int, comment: str) -> None:
         state = self._store_state()
@@ -146,31 +183,72 @@ class State:
             self.ko_mapping = new_mapping
 
     def clones_groups(self) -> List[Tuple[str, bool]]:
-        return samplesheet.get_groups(self.samplesheet)
+        return [
+            (group, any(knockouts[0]["split"].values()))
+            for group, knockouts in self._grouped_knockouts().items()
+        ]
 
     def clones_get_group(self, group: str) -> List[Clone]:
         clones = {}  # type: Dict[str, Clone]
 
-        for knockout in samplesheet.get_group(self.samplesheet, group):
+        for knockout in self._grouped_knockouts().get(group, ()):
             ss_target = knockout["headers"]["knockout"]
             ms_target = self.ko_mapping[ss_target]
 
-            miseq = {} if ms_target is None else self.miseq[ms_target]
+            # Unmapped knockouts are resolved outside the per-cell loop
+            results = {} if ms_target is None else self.miseq[ms_target]
+            get_result = results.get
+
             for index, key in enumerate(knockout["column"], start=1):
                 if key is not None:
                     try:
-                        clone = clones[key]
+                        knockouts = clones[key]["knockouts"]
                     except KeyError:
-                        clone = clones[key] = {
+                        knockouts = {}
+                        clones[key] = {
                             "label": key,
                             "comment": None,
-                            "knockouts": {},
+                            "knockouts": knockouts,
                         }
 
-                    clone["knockouts"][ss_target] = miseq.get(index)
+                    knockouts[ss_target] = get_result(index)
 
         return sorted(clones.values(), key=lambda clone: label_to_key(clone["label"]))
 
+    def _grouped_knockouts(self) -> samplesheet.GroupedKnockouts:
+        # The samplesheet is replaced rather than modified, so the grouping only needs
+        # to be recomputed when a different samplesheet is seen
+        cache = self._grouped_knockouts_cache
+        if cache is None or cache[0] is not self.samplesheet:
+            cache = (self.samplesheet, samplesheet.group_knockouts(self.samplesheet))
+            self._grouped_knockouts_cache = cache
+
+        return cache[1]
+
+    def _samplesheet_columns(self) -> samplesheet.KnockoutColumns:
+        cache = self._ss_columns_cache
+        if cache is None or cache[0] is not self.samplesheet:
+            cache = (self.samplesheet, samplesheet.get_columns_by_ko(self.samplesheet))
+            self._ss_columns_cache = cache
+
+        return cache[1]
+
+    def _inverse_ko_mapping(self) -> Dict[str, str]:
+        # Like the samplesheet, the mapping is replaced rather than modified; each
+        # MiSeq target is mapped to at most one samplesheet target
+        cache = self._inverse_ko_mapping_cache
+        if cache is None or cache[0] is not self.ko_mapping:
+            inverse = {
+                value: key
+                for key, value in self.ko_mapping.items()
+                if value is not None
+            }
+
+            cache = (self.ko_mapping, inverse)
+            self._inverse_ko_mapping_cache = cache
+
+        return cache[1]
+
     @property
     def redo_count(self) -> int:
         return len(self._redo_history)
@@ -180,17 +258,55 @@ class State:
         return len(self._undo_history)
 
     def export(self, filename: str, everything: bool = False) -> None:
-        workbook = openpyxl.Workbook()
-        sheet = workbook.active
-
-        bd_fat_bottom = openpyxl.styles.borders.Border(
-            bottom=openpyxl.styles.borders.Side("medium")
-        )
-        bd_thin_bottom = openpyxl.styles.borders.Border(
-            bottom=openpyxl.styles.borders.Side("thin")
-        )
-        grey_font = openpyxl.styles.Font(color="FFB7B7B7")
-        blue_back = openpyxl.styles.PatternFill("solid", fgColor="D3E8EE")
+        # Rows are streamed to disk as they are appended, since every cell is written
+        # in order and with its final style
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+
+        fonts = {"grey": openpyxl.styles.Font(color="FFB7B7B7")}
+        fills = {"blue": openpyxl.styles.PatternFill("solid", fgColor="D3E8EE")}
+
+        # Combinations of (bottom) borders and highlights are registered once as
+        # named styles, instead of assigning border/font/fill objects to every cell
+        named_styles = {(None, None): None}  # type: Dict[Any, Optional[str]]
+
+        def named_style(border, highlight):
+            key = (border, highlight)
+            if key not in named_styles:
+                name = " ".join(filter(None, ("export", highlight, border)))
+                workbook.add_named_style(
+                    openpyxl.styles.NamedStyle(
+                        name=name,
+                        font=fonts.get(highlight, openpyxl.styles.DEFAULT_FONT),
+                        fill=fills.get(highlight),
+                        border=openpyxl.styles.borders.Border(
+                            bottom=openpyxl.styles.borders.Side(border)
+                        ),
+                    )
+                )
+                named_styles[key] = name
+
+            return named_styles[key]
+
+        # Each cell is created with its final style, rather than being restyled
+        # once the following rows are known
+        def append_row(values, border=None, highlight=None):
+            style = named_style(border, highlight)
+            # Group and clone labels are never greyed out
+            label_style = named_style(
+                border, None if highlight == "grey" else highlight
+            )
+
+            cells = []
+            for column, value in enumerate(values):
+                cell = openpyxl.cell.WriteOnlyCell(sheet, value=value)
+                if column < 2 and label_style is not None:
+                    cell.style = label_style
+                elif column >= 2 and style is not None:
+                    cell.style = style
+                cells.append(cell)
+
+            sheet.append(cells)
 
         headers = (
             "Group",
@@ -203,11 +319,10 @@ class State:
             "%Total",
             "Comment",
         )
-        sheet.append(headers)
-        for column, _ in enumerate(headers, start=1):
-            sheet.cell(row=1, column=column).border = bd_fat_bottom
+        append_row(headers, border="medium")
 
-        last_row = 1
+        # Groups are collected first, so that it is known which group is the last
+        groups = []  # type: List[Tuple[str, bool, List[Clone]]]
         for group, is_split in self.clones_groups():
             clones = self.clones_get_group(group)
             if not (is_split or everything):
@@ -217,19 +332,14 @@ class State:
                     if any(ko and ko["picked"] for ko in clone["knockouts"].values())
                 ]
 
-            if not clones:
-                continue
-
-            for column in range(1, len(headers) + 1):
-                sheet.cell(row=last_row, column=column).border = bd_fat_bottom
-
-            for not_first_clone, clone in enumerate(clones):
-                first_row = True
-                if not_first_clone:
-                    for column in range(1, len(headers) + 1):
-                        sheet.cell(row=last_row, column=column).border = bd_thin_bottom
+            if clones:
+                groups.append((group, is_split, clones))
 
-                for key, knockout in sorted(clone["knockouts"].items()):
+        for group_idx, (group, is_split, clones) in enumerate(groups):
+            for clone_idx, clone in enumerate(clones):
+                knockouts = sorted(clone["knockouts"].items())
+                for knockout_idx, (key, knockout) in enumerate(knockouts):
+                    first_row = not knockout_idx
                     row = [
                         group if first_row else None,
                         clone["label"] if first_row else None,
@@ -271,58 +381,93 @@ class State:
                             )
                         )
 
-                    sheet.append(row)
-                    first_row = False
-                    last_row += 1
+                    # Clones within a group are separated by thin borders
+                    border = None
+                    if (
+                        knockout_idx == len(knockouts) - 1
+                        and clone_idx < len(clones) - 1
+                    ):
+                        border = "thin"
 
                     if not (knockout and (is_split or knockout["picked"])):
-                        for column in range(3, len(headers) + 1):
-                            sheet.cell(row=last_row, column=column).font = grey_font
+                        append_row(row, border=border, highlight="grey")
                     elif knockout["comment"].lower() in ("wt", "wildtype"):
-                        for column in range(1, len(headers) + 1):
-                            sheet.cell(row=last_row, column=column).fill = blue_back
+                        append_row(row, border=border, highlight="blue")
+                    else:
+                        append_row(row, border=border)
 
-            sheet.append([])
-            last_row += 1
+            # Groups are separated by empty rows with fat borders
+            if group_idx < len(groups) - 1:
+                append_row((None,) * len(headers), border="medium")
 
         workbook.save(filename)
 
     def load_state(self, filename: str) -> None:
         with open(filename, "rb") as handle:
             state = self._store_state()
-            self._replace_state(pickle.loads(handle.read()))
+            # Projects are stored as plain dicts, independent of the snapshot class
+            self._replace_state(_Snapshot(**pickle.load(handle)))
             self._append_undo_history(state)
         self._saved_state = self._store_state()
 
     def save_state(self, filename: str) -> None:
         state = self._store_state()
-        with open(filename, "wb") as handle:
-            handle.write(pickle.dumps(state))
+
+        # Write to a temporary file first, so that an existing project is never left
+        # partially written if saving fails or the program crashes
+        temp_filename = f"{filename}.tmp"
+        try:
+            with open(temp_filename, "wb") as handle:
+                pickle.dump(dict(state._asdict()), handle, protocol=PICKLE_PROTOCOL)
+                handle.flush()
+                os.fsync(handle.fileno())
+
+            os.replace(temp_filename, filename)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(temp_filename)
+            raise
+
         self._saved_state = state
 
     def is_saved(self) -> bool:
-        return self._saved_state == self._store_state()
+        # State is replaced rather than modified, so an unchanged state consists of
+        # the very same objects; this avoids comparing the entire state on refresh
+        return all(
+            saved is current
+            for saved, current in zip(self._saved_state, self._store_state())
+        )
 
     def _store_state(self) -> _Snapshot:
-        return {
-            "samplesheet": self.samplesheet,
-            "miseq": self.miseq,
-            "ko_mapping": self.ko_mapping,
-            "default_ko_mapping": self.default_ko_mapping,
-        }
+        return _Snapshot(
+            samplesheet=self.samplesheet,
+            miseq=self.miseq,
+            ko_mapping=self.ko_mapping,
+            default_ko_mapping=self.default_ko_mapping,
+        )
 
     def _append_undo_history(self, state: _Snapshot) -> None:
         self._redo_history.clear()
         self._undo_history.append(state)
 
     def _replace_state(self, state: _Snapshot) -> None:
-        for key, value in state.items():
-            setattr(self, key, value)
+        (
+            self.samplesheet,
+            self.miseq,
+            self.ko_mapping,
+            self.default_ko_mapping,
+        ) = state
 
     def _init_ko_mapping(self) -> None:
         miseq_targets = set(self.miseq_target_names())
         target_names = set(self.samplesheet_target_names())
 
+        # MiSeq keys are mangled once, rather than once per samplesheet target
+        mangled_miseq_keys = {
+            miseq_key: miseq_key.lower().replace(" ", "_")
+            for miseq_key in miseq_targets
+        }
+
         candidates = []
         for target_key in target_names:
             # Exact matching
@@ -332,9 +477,7 @@ class State:
 
             # Partial/case-insensitive matching
             mangled_target_key = target_key.lower().replace(" ", "_")
-            for miseq_key in miseq_targets:
-                mangled_miseq_key = miseq_key.lower().replace(" ", "_")
-
+            for miseq_key, mangled_miseq_key in mangled_miseq_keys.items():
                 if mangled_target_key.startswith(mangled_miseq_key):
                     candidates.append((target_key, miseq_key))
                 elif mangled_miseq_key.startswith(mangled_target_key):
@@ -1,16 +1,14 @@
-import copy
 import json
+import operator
 import os
 import re
+import sys
 
-
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, List, Set, Tuple
 
 from mypy_extensions import TypedDict
 
-import xlrd
-
-from common import xlsx_strip
+from common import xlsx_open, xlsx_read_rows
 
 
 class MiSeqOutputError(Exception):
@@ -25,6 +23,7 @@ TARGET_LOCAL_THRESHOLD_PERCENTAGE = 0.05
 
 _PEAK_RE = re.compile(r"^peak([0-9]+)$", re.I)
 _PEAK_INDEL = re.compile(r"(-?[0-9]+)( \(inframe\))?")
+_PEAK_PCT = operator.itemgetter("pct")
 
 Peak = TypedDict(
     "Peak",
@@ -67,58 +66,79 @@ def load(filename):
 
 def load_xlsx(filename: str) -> MiSeqOutput:
     knockouts = {}  # type: MiSeqOutput
-    with xlrd.open_workbook(filename) as workbook:
-
-        def _read_row(row: int) -> List[Any]:
-            return [
-                xlsx_strip(sheet.cell(row, column).value)
-                for column in range(sheet.ncols)
+    with xlsx_open(filename) as workbook:
+        for sheet in workbook.worksheets:
+            rows = xlsx_read_rows(sheet)
+            header = next(rows, None)
+            if header is None:
+                continue
+
+            columns = {name: idx for idx, name in enumerate(header)}
+            target_idx = columns["Target"]
+            index_idx = columns["Index/Well"]
+            reads_idx = columns["Reads"]
+            wt_idx = columns["WT"]
+            indel_idx = columns["Indel"]
+            # Triples of (peakN, peakN%, name) columns; the peakN% column may be missing
+            peak_columns = [
+                (idx, columns.get(name + "%"), name)
+                for idx, name in enumerate(header)
+                if _PEAK_RE.match(name)
             ]
 
-        for sheet in workbook.sheets():
-            header = _read_row(0)
-
-            for row_idx in range(1, sheet.nrows):
-                row = _read_row(row_idx)
-                if len(row) != len(header):
+            for row_idx, row in enumerate(rows, start=1):
+                if len(row) > len(header):
                     raise MiSeqOutputError(
                         f"Row {row_idx} contains the wrong " "number of columns!"
                     )
 
-                values = dict(zip(header, row))
-                knockout = values["Target"]
+                # Rows may be ragged if the sheet does not specify its dimensions
+                row.extend([""] * (len(header) - len(row)))
+
+                # Target names are repeated for every well; interning them means that
+                # results share a single string, which is also pickled only once
+                knockout = row[target_idx]
+                if isinstance(knockout, str):
+                    knockout = sys.intern(knockout)
 
                 result = {
                     "target": knockout,
-                    "index": int(values["Index/Well"]),
-                    "reads": int(values["Reads"]),
-                    "wt": int(values["WT"]),
-                    "indel": int(values["Indel"]),
+                    "index": int(row[index_idx]),
+                    "reads": int(row[reads_idx]),
+                    "wt": int(row[wt_idx]),
+                    "indel": int(row[indel_idx]),
                     "picked": False,
                     "peaks": [],
                     "comment": "",
                 }  # type: Result
 
-                for key, value in values.items():
-                    if _PEAK_RE.match(key) and value:
+                any_inframe = False
+                for peak_idx, pct_idx, peak_name in peak_columns:
+                    value = row[peak_idx]
+                    if value:
+                        if pct_idx is None:
+                            raise MiSeqOutputError(
+                                f"Column '{peak_name}%' is missing from the header!"
+                            )
+
                         indel, inframe = _PEAK_INDEL.match(value).groups()
-                        pct = values[key + "%"]
+                        any_inframe |= bool(inframe)
 
                         result["peaks"].append(
                             {
                                 "indel": int(indel),
                                 "inframe": bool(inframe),
-                                "pct": float(pct),
+                                "pct": float(row[pct_idx]),
                             }
                         )
 
-                if any(peak["inframe"] for peak in result["peaks"]):
+                if any_inframe:
                     result["comment"] = "(inframe)"
 
-                result["peaks"].sort(key=lambda peak: peak["pct"], reverse=True)
+                result["peaks"].sort(key=_PEAK_PCT, reverse=True)
 
                 column = knockouts.setdefault(knockout, {})
-                column[int(values["Index/Well"])] = result
+                column[result["index"]] = result
 
     return knockouts
 
@@ -131,6 +151,7 @@ def load_json(filename: str) -> MiSeqOutput:
 
     for sample_name, sample in data["samples"].items():
         for target_name, stats in sample["targets"].items():
+            target_name = sys.intern(target_name)
             result = {
                 "target": target_name,
                 "index": int(sample_name),
@@ -142,25 +163,30 @@ def load_json(filename: str) -> MiSeqOutput:
                 "comment": "",
             }  # type: Result
 
+            any_inframe = False
             for peak, count in stats["peaks"].items():
-                pct = count / int(stats["reads"])
+                pct = count / result["reads"]
                 if pct < TARGET_LOCAL_THRESHOLD_PERCENTAGE:
                     continue
                 elif count < TARGET_LOCAL_THRESHOLD_READS:
                     continue
 
+                indel = int(peak)
+                inframe = indel % 3 == 0
+                any_inframe |= inframe
+
                 result["peaks"].append(
                     {
-                        "indel": int(peak),
-                        "inframe": abs(int(peak)) % 3 == 0,
+                        "indel": indel,
+                        "inframe": inframe,
                         "pct": pct,
                     }
                 )
 
-            if any(peak["inframe"] for peak in result["peaks"]):
+            if any_inframe:
                 result["comment"] = "In-frame"
 
-            result["peaks"].sort(key=lambda peak: peak["pct"], reverse=True)
+            result["peaks"].sort(key=_PEAK_PCT, reverse=True)
 
             column = knockouts.setdefault(target_name, {})
             column[int(sample_name)] = result
@@ -173,17 +199,38 @@ def is_picked(miseq: MiSeqOutput, target: str, index: int) -> bool:
 
 
 def toggle_picked(miseq: MiSeqOutput, target: str, index: int) -> MiSeqOutput:
-    miseq = copy.deepcopy(miseq)
-    miseq[target][index]["picked"] = not is_picked(miseq, target, index)
-
-    return miseq
+    return _shallow_replace(
+        miseq, target, index, picked=not is_picked(miseq, target, index)
+    )
 
 
 def set_picked(
     miseq: MiSeqOutput, target: str, index: int, picked: bool
 ) -> MiSeqOutput:
-    miseq = copy.deepcopy(miseq)
-    miseq[target][index]["picked"] = picked
+    return _shallow_replace(miseq, target, index, picked=picked)
+
+
+def set_picked_many(
+    miseq: MiSeqOutput, results: Iterable[Tuple[str, int]], picked: bool
+) -> MiSeqOutput:
+    # The original is returned if no results change, so that no-ops can be detected
+    original = miseq
+    copied = set()  # type: Set[str]
+    for target, index in results:
+        if miseq[target][index]["picked"] == picked:
+            continue
+
+        if miseq is original:
+            miseq = dict(miseq)
+
+        column = miseq[target]
+        if target not in copied:
+            column = miseq[target] = dict(column)
+            copied.add(target)
+
+        result = column[index].copy()
+        result["picked"] = picked
+        column[index] = result
 
     return miseq
 
@@ -191,7 +238,21 @@ def set_picked(
 def set_comment(
     miseq: MiSeqOutput, target: str, index: int, comment: str
 ) -> MiSeqOutput:
-    miseq = copy.deepcopy(miseq)
-    miseq[target][index]["comment"] = comment
+    return _shallow_replace(miseq, target, index, comment=comment)
+
+
+def _shallow_replace(
+    miseq: MiSeqOutput, target: str, index: int, **fields: Any
+) -> MiSeqOutput:
+    # Only the containers leading to the modified result are copied; everything
+    # else (including the peaks of the result itself) is shared with the original
+    result = miseq[target][index].copy()
+    result.update(fields)  # type: ignore
+
+    column = dict(miseq[target])
+    column[index] = result
+
+    miseq = dict(miseq)
+    miseq[target] = column
 
     return miseq
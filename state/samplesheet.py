@@ -1,9 +1,7 @@
 #!/usr/bin/env python3
 import collections
-import copy
-from typing import Dict, List, Optional, Tuple, Set
 
-import xlrd
+from typing import Dict, List, Optional, Tuple, Set
 
 from mypy_extensions import TypedDict
 
@@ -51,13 +49,15 @@ SampleSheet = TypedDict(
 
 
 GroupCellCounts = Dict[str, Set[int]]
+# Knockouts by group, in the order in which groups first appear
+GroupedKnockouts = Dict[str, List[Knockout]]
+KnockoutColumns = Dict[str, List[Optional[str]]]
 
 
 def load(filename: str) -> SampleSheet:
-    # Read first sheet in spreadsheet (as columns)
-    table = _read_xlsx_columns(filename)
-    # Locate rectangle containing knockouts (0 or 1s)
-    cells = _locate_cells(table)
+    # Read first sheet in spreadsheet, locating the rectangle containing knockouts
+    # (0 or 1s) while reading
+    rows, cells = _read_xlsx_rows(filename)
 
     if not cells:
         raise SampleSheetError("Could not locate knockouts")
@@ -66,12 +66,10 @@ def load(filename: str) -> SampleSheet:
 
     knockouts = []  # type: List[Knockout]
     for column_idx in range(cells.left, cells.right):
-        column = table[column_idx]
-
         headers = {}
         for offset, key in enumerate(reversed(HEADERS), start=1):
             if cells.top - offset >= 0:
-                value = column[cells.top - offset]
+                value = rows[cells.top - offset][column_idx]
                 if not value and knockouts:
                     # Groupings propagate left-to-right
                     value = knockouts[-1]["headers"][key]
@@ -86,8 +84,8 @@ def load(filename: str) -> SampleSheet:
         knockouts.append(
             {
                 "column": [
-                    "DummyValue" if value else None
-                    for value in column[cells.top : cells.bottom]
+                    "DummyValue" if row[column_idx] else None
+                    for row in rows[cells.top : cells.bottom]
                 ],
                 "headers": headers,
                 "group": str(column_idx),
@@ -113,18 +111,26 @@ def load(filename: str) -> SampleSheet:
 def group_by(samplesheet: SampleSheet, key: str) -> SampleSheet:
     cell_counts = collections.defaultdict(set)  # type: GroupCellCounts
 
-    samplesheet = copy.deepcopy(samplesheet)
+    # Knockouts are copied, but their headers and columns are only ever replaced and
+    # can therefore be shared with the original samplesheet
+    samplesheet = samplesheet.copy()
     samplesheet["group_by"] = key
+    samplesheet["knockouts"] = [
+        knockout.copy() for knockout in samplesheet["knockouts"]
+    ]
 
     for knockout in samplesheet["knockouts"]:
         current_group = knockout["headers"][key]
         knockout["group"] = current_group
-        cell_counts[current_group].add(sum(map(bool, knockout["column"])))
+        cell_counts[current_group].add(_count_cells(knockout["column"]))
+
+    # Groups in which knockouts have differing (non-zero) numbers of clones
+    verification_groups = {
+        group for group, counts in cell_counts.items() if len(counts - {0}) > 1
+    }
 
-    cell_counts = dict(cell_counts)
     for knockout in samplesheet["knockouts"]:
-        group = knockout["group"]
-        is_verification = len(cell_counts[group] - set((0,))) > 1
+        is_verification = knockout["group"] in verification_groups
 
         knockout["split"] = {
             "auto": is_verification,
@@ -137,11 +143,19 @@ def group_by(samplesheet: SampleSheet, key: str) -> SampleSheet:
 
 
 def set_user_split(samplesheet: SampleSheet, group: str, value: bool) -> SampleSheet:
-    samplesheet = copy.deepcopy(samplesheet)
-
+    knockouts = []  # type: List[Knockout]
     for knockout in samplesheet["knockouts"]:
         if knockout["group"] == group:
-            knockout["split"]["user"] = value
+            knockout = knockout.copy()
+            knockout["split"] = {
+                "auto": knockout["split"]["auto"],
+                "user": value,
+            }
+
+        knockouts.append(knockout)
+
+    samplesheet = samplesheet.copy()
+    samplesheet["knockouts"] = knockouts
 
     return samplesheet
 
@@ -154,26 +168,21 @@ def get_column_for_ko(samplesheet: SampleSheet, knockout: str) -> List[Optional[
     return ["<NA>"] * 96
 
 
-def get_groups(samplesheet: SampleSheet) -> List[Tuple[str, bool]]:
-    result = []
-    observed = set()  # type: Set[str]
-
-    for knockout in samplesheet["knockouts"]:
-        group = _group(knockout)
-        if group not in observed:
-            result.append((group, any(knockout["split"].values())))
-            observed.add(group)
+def get_columns_by_ko(samplesheet: SampleSheet) -> KnockoutColumns:
+    columns = {}  # type: KnockoutColumns
+    for ko in samplesheet["knockouts"]:
+        # Like get_column_for_ko, the first knockout with a given name is used
+        columns.setdefault(ko["headers"]["knockout"], ko["column"])
 
-    return result
+    return columns
 
 
-def get_group(samplesheet: SampleSheet, group: str) -> List[Knockout]:
-    knockouts = []
+def group_knockouts(samplesheet: SampleSheet) -> GroupedKnockouts:
+    groups = {}  # type: GroupedKnockouts
     for knockout in samplesheet["knockouts"]:
-        if _group(knockout) == group:
-            knockouts.append(knockout)
+        groups.setdefault(_group(knockout), []).append(knockout)
 
-    return knockouts
+    return groups
 
 
 _Rect = collections.namedtuple("_Rect", ("top", "left", "bottom", "right"))
@@ -187,6 +196,11 @@ def _group(knockout: Knockout) -> str:
     return knockout["group"]
 
 
+def _count_cells(column: List[Optional[str]]) -> int:
+    # Cells are either None or (non-empty) labels
+    return len(column) - column.count(None)
+
+
 def _update_cell_labels(
     column: List[Optional[str]], is_verification: bool
 ) -> List[Optional[str]]:
@@ -206,75 +220,64 @@ def _update_cell_labels(
 XLSXTable = List[List[object]]
 
 
-def _read_xlsx_columns(filename: str) -> XLSXTable:
-    table = []
-
-    with xlrd.open_workbook(filename) as workbook:
-        for sheet in workbook.sheets():
-            for column in range(sheet.ncols):
-                cells = []
-
-                for row in range(sheet.nrows):
-                    value = sheet.cell(row, column).value
-
-                    cells.append(common.xlsx_strip(value))
-
-                table.append(cells)
-
-            # Only read first sheet
-            break
-
-    return table
-
-
-def _locate_cells(table: XLSXTable) -> Optional[_Rect]:
-    best_row = None
-    best_column = None
-    best_width = 0
-    best_height = 0
-
-    for column_idx, column in enumerate(table):
-        if (len(table) - column_idx) * len(column) < best_width * best_height:
-            break
-
-        for row_idx, _ in enumerate(column):
-            width, height = _grow_selection(table, row_idx, column_idx)
-            if width * height > best_width * best_height:
-                best_row = row_idx
-                best_column = column_idx
-                best_width = width
-                best_height = height
-
-    if best_row is not None and best_column is not None:
-        return _Rect(
-            top=best_row,
-            left=best_column,
-            bottom=best_row + best_height,
-            right=best_column + best_width,
-        )
-
-    return None
-
-
-def _grow_selection(
-    table: List[List[object]], row_idx: int, column_idx: int
-) -> Tuple[int, int]:
-    width = 0
-    height = 0
-
-    for column in table[column_idx:]:
-        current_height = 0
-
-        for cell in column[row_idx:]:
-            if cell in (0, 1):
-                current_height += 1
-            else:
-                break
-
-        if not current_height or current_height < height:
-            break
-
-        width += 1
-        height = min(height or current_height, current_height)
-
-    return width, height
+def _read_xlsx_rows(filename: str) -> Tuple[XLSXTable, Optional[_Rect]]:
+    rows = []  # type: XLSXTable
+    best = None  # type: Optional[_Rect]
+    # Number of consecutive 0/1 cells ending at (and above) the current row
+    heights = []  # type: List[int]
+
+    with common.xlsx_open(filename) as workbook:
+        # Only read first sheet
+        for row in common.xlsx_read_rows(workbook.worksheets[0]):
+            rows.append(row)
+            if len(row) > len(heights):
+                heights.extend([0] * (len(row) - len(heights)))
+
+            for column_idx, height in enumerate(heights):
+                if column_idx < len(row) and row[column_idx] in (0, 1):
+                    heights[column_idx] = height + 1
+                else:
+                    heights[column_idx] = 0
+
+            best = _locate_cells(heights, len(rows), best)
+
+    # Rows may be ragged if the sheet does not specify its dimensions
+    for row in rows:
+        row.extend([""] * (len(heights) - len(row)))
+
+    return rows, best
+
+
+def _locate_cells(
+    heights: List[int], bottom: int, best: Optional[_Rect]
+) -> Optional[_Rect]:
+    best_area = 0
+    if best is not None:
+        best_area = (best.bottom - best.top) * (best.right - best.left)
+
+    # No rectangle in this histogram can be larger than the sum of its bars
+    if sum(heights) <= best_area:
+        return best
+
+    # Heights form a histogram of 0/1 cells standing on the current row; the largest
+    # rectangle in the histogram is found using a stack of bars with increasing
+    # heights, each bar extending left to the column it starts in.
+    stack = []  # type: List[Tuple[int, int]]
+    for column_idx, height in enumerate(heights + [0]):
+        start = column_idx
+        while stack and stack[-1][1] >= height:
+            start, bar_height = stack.pop()
+
+            area = bar_height * (column_idx - start)
+            if area > best_area:
+                best_area = area
+                best = _Rect(
+                    top=bottom - bar_height,
+                    left=start,
+                    bottom=bottom,
+                    right=column_idx,
+                )
+
+        stack.append((start, height))
+
+    return best
@@ -1,11 +1,12 @@
 from .clones import ClonesWidget
 from .samplesheet import SampleSheetWidget
 from .mapping import KOMappingWidget
-from .miseq import MiSeqOutputWidget
+from .miseq import MiSeqOutputWidget, VirtualListCtrl
 
 __all__ = [
     "ClonesWidget",
     "KOMappingWidget",
     "MiSeqOutputWidget",
     "SampleSheetWidget",
+    "VirtualListCtrl",
 ]
@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
+import bisect
+import collections
+import itertools
+import operator
 import os
 
 import wx
 import wx.propgrid
 
-from typing import Any, List
+from typing import Any, Counter, Dict, List, Optional, Tuple
 
-from common import wx_bind, wx_find
+from common import (
+    wx_bind,
+    wx_find,
+    wx_set_cell_background_colour,
+    wx_set_cell_text_colour,
+    wx_set_cell_value,
+)
 from state import Clone, State
 
 
@@ -22,6 +32,13 @@ _COL_NUM_READS = 8
 _COL_COMMENT = 9
 _NUM_COLUMNS = 10
 
+# Delay before refreshing in response to checkboxes/group selection, during which
+# further events are merged into a single refresh
+_REFRESH_DELAY_MS = 50
+
+# Peaks of a result, followed by their indels, percentages, and in-frame status
+_PeaksText = Tuple[List[Any], str, str, bool]
+
 
 class StrRenderWithBorder(wx.grid.GridCellStringRenderer):
     def __init__(self, *args: Any, **kwargs: Any) -> None:
@@ -44,16 +61,32 @@ class ClonesWidget(object):
         self._root = root
         self._state = state
         self._clones = []  # type: List[Clone]
+        # First grid row of each clone, followed by the total number of rows
+        self._clone_offsets = [0]  # type: List[int]
+        # Sorted knockout names for each clone
+        self._clone_keys = []  # type: List[List[str]]
+        self._refresh_timer = None  # type: Optional[wx.CallLater]
+        # Groups in the list box, which initially contains placeholder items
+        self._shown_groups = None  # type: Optional[List[str]]
+        # Statistics shown in the property grid, if any
+        self._shown_stats = None  # type: Optional[Dict[str, Any]]
+        # Formatted peaks by id of (and including) the list of peaks in a result
+        self._peaks_text = {}  # type: Dict[int, _PeaksText]
 
         self._sort_by_picked = wx_find("clones_sort_by_picked")
         self._show_picked = wx_find("clones_show_picked")
         self._groups = wx_find("clones_groups")
         self._props = wx_find("clones_properties")
 
+        self._plain_renderer = wx.grid.GridCellStringRenderer()
+        self._border_renderer = StrRenderWithBorder()
+
         self.grid = wx_find("clones_report")
         self.grid.CreateGrid(0, _NUM_COLUMNS)
         self.grid.EnableEditing(False)
         self.grid.HideRowLabels()
+        # Prevent resizing of rows
+        self.grid.DisableDragRowSize()
 
         for col, value in enumerate(
             (
@@ -83,8 +116,8 @@ class ClonesWidget(object):
         wx_bind("clones_export_everything", wx.EVT_BUTTON, self.OnExportEverything)
         wx_bind("clones_save", wx.EVT_BUTTON, root.save_state)
         wx_bind("clones_load", wx.EVT_BUTTON, root.load_state)
-        wx_bind("clones_show_picked", wx.EVT_CHECKBOX, self.refresh_ui)
-        wx_bind("clones_sort_by_picked", wx.EVT_CHECKBOX, self.refresh_ui)
+        wx_bind("clones_show_picked", wx.EVT_CHECKBOX, self.OnCheckBox)
+        wx_bind("clones_sort_by_picked", wx.EVT_CHECKBOX, self.OnCheckBox)
 
         self.refresh_ui()
 
@@ -95,7 +128,10 @@ class ClonesWidget(object):
         self.export_clones(everything=True)
 
     def OnListBox(self, _event: Any) -> None:
-        self.refresh_ui()
+        self._schedule_refresh()
+
+    def OnCheckBox(self, _event: Any) -> None:
+        self._schedule_refresh()
 
     def OnCellDoubleClick(self, event: Any) -> None:
         if self._clones:
@@ -103,17 +139,11 @@ class ClonesWidget(object):
 
             clone = None
             result = None
-            current_row = 0
-            for clone in self._clones:
-                knockouts = clone["knockouts"]
-
-                if current_row <= row < current_row + len(knockouts):
-                    keys = sorted(knockouts)
-                    key = keys[row - current_row]
-                    result = clone["knockouts"][key]
-                    break
-
-                current_row += len(clone["knockouts"])
+            idx = bisect.bisect_right(self._clone_offsets, row) - 1
+            if 0 <= idx < len(self._clones):
+                clone = self._clones[idx]
+                key = self._clone_keys[idx][row - self._clone_offsets[idx]]
+                result = clone["knockouts"][key]
 
             if result is not None:
                 if event.GetCol() < _COL_KOS:
@@ -154,6 +184,9 @@ class ClonesWidget(object):
                     raise
 
     def refresh_ui(self, *_args: Any, **_kwargs: Any) -> None:
+        if self._refresh_timer is not None:
+            self._refresh_timer.Stop()
+
         self._refresh_groups()
 
         group = None
@@ -163,13 +196,18 @@ class ClonesWidget(object):
         self._refresh_clones(group)
         self._refresh_statistics(group)
 
+    def _schedule_refresh(self) -> None:
+        if self._refresh_timer is None:
+            self._refresh_timer = wx.CallLater(_REFRESH_DELAY_MS, self.refresh_ui)
+        else:
+            self._refresh_timer.Start(_REFRESH_DELAY_MS)
+
     def _refresh_groups(self):
         groups = [k for k, _ in self._state.clones_groups()]
-        ui_groups = [
-            self._groups.GetString(idx) for idx in range(self._groups.GetCount())
-        ]
 
-        if groups != ui_groups:
+        # The list box is only modified here, so the groups shown need not be read back
+        if groups != self._shown_groups:
+            self._shown_groups = groups
             self._groups.Clear()
             if groups:
                 self._groups.InsertItems(groups, 0)
@@ -178,44 +216,84 @@ class ClonesWidget(object):
     def _refresh_clones(self, group):
         if group is None:
             self._reset_grid(_NUM_COLUMNS, 0)
+            self._clones = []
+            self._clone_offsets = [0]
+            self._clone_keys = []
             return
 
-        clones = self._state.clones_get_group(group)
+        # Picked knockouts are collected once per clone for filtering, sorting and
+        # drawing the clones
+        decorated = [
+            (_picked_count_key(clone), clone)
+            for clone in self._state.clones_get_group(group)
+        ]
         if self._show_picked.GetValue():
-            clones = [clone for clone in clones if _picked_count(clone)]
+            decorated = [(key, clone) for key, clone in decorated if key[0]]
 
         if self._sort_by_picked.GetValue():
-            clones.sort(key=_picked_count_key)
-
-        if clones != self._clones:
-            n_rows = sum(max(1, len(clone["knockouts"])) for clone in clones)
-            self._reset_grid(_NUM_COLUMNS, n_rows)
+            decorated.sort(key=operator.itemgetter(0))
 
-            row = 0
-            for clone in clones:
-                self._draw_clone(clone, row)
+        clones = [clone for _, clone in decorated]
 
-                row += max(1, len(clone["knockouts"]))
+        if clones != self._clones:
+            clone_keys = [sorted(clone["knockouts"]) for clone in clones]
+            clone_offsets = [0]
+            clone_offsets.extend(
+                itertools.accumulate(max(1, len(keys)) for keys in clone_keys)
+            )
+            # Unless rows were added or removed, only clones that changed (for example
+            # when a result is picked) need to be redrawn
+            redraw_all = clone_offsets != self._clone_offsets
+
+            # Defer repainting until every cell has been updated
+            self.grid.BeginBatch()
+            try:
+                if redraw_all:
+                    self._reset_grid(_NUM_COLUMNS, clone_offsets[-1])
+                    # Only peaks shown in the current view are kept
+                    self._peaks_text = {}
+
+                for idx, (clone, keys) in enumerate(zip(clones, clone_keys)):
+                    if redraw_all or clone != self._clones[idx]:
+                        picked_count = -decorated[idx][0][0]
+                        self._draw_clone(clone, keys, picked_count, clone_offsets[idx])
+            finally:
+                self.grid.EndBatch()
 
             self._clones = clones
+            self._clone_offsets = clone_offsets
+            self._clone_keys = clone_keys
 
-        for column in (_COL_KOS, _COL_INDELS, _COL_INDELS_PCT, _COL_COMMENT):
-            self.grid.AutoSizeColumn(column)
+            # Sizing columns measures every cell, so it is only done if cells changed
+            for column in (_COL_KOS, _COL_INDELS, _COL_INDELS_PCT, _COL_COMMENT):
+                self.grid.AutoSizeColumn(column)
 
     def _refresh_statistics(self, group):
-        props = self._props
-        props.Clear()
-
-        if not group:
+        stats = self._knockout_stats(group) if group else None
+        # Rebuilding the property grid is slow, so it is skipped if nothing changed
+        if stats == self._shown_stats:
             return
 
+        self._shown_stats = stats
+
+        props = self._props
+        props.Freeze()
+        try:
+            props.Clear()
+            if stats is not None:
+                self._add_statistics(stats)
+        finally:
+            props.Thaw()
+
+    def _add_statistics(self, stats):
+        props = self._props
+
         def _add_category(value):
             props.Append(wx.propgrid.PropertyCategory(value))
 
         def _add_property(label, value):
             props.Append(wx.propgrid.IntProperty(label, wx.propgrid.PG_LABEL, value))
 
-        stats = self._knockout_stats(group)
         count = stats["clones"]["count"]
 
         _add_category("Clones")
@@ -237,39 +315,35 @@ class ClonesWidget(object):
         data = self._state.clones_get_group(group)
 
         knockout_count = [0] * (len(data[0]["knockouts"]) + 1)
-        for clone in data:
-            knockout_count[sum(map(bool, clone["knockouts"].values()))] += 1
-
-        knockouts = {}
-        for key in sorted(data[0]["knockouts"]):
-            has_data = 0
-            has_peaks = 0
-            inframe = 0
-
-            for clone in data:
-                knockout = clone["knockouts"][key]
-                if knockout:
-                    has_data += 1
-                    has_peaks += bool(knockout["peaks"])
-                    inframe += any(
-                        abs(peak["indel"]) % 3 == 0 for peak in knockout["peaks"]
-                    )
-
-            knockouts[key] = {
-                "has_data": has_data,
-                "has_peaks": has_peaks,
-                "inframe": inframe,
+        knockouts = {
+            key: {
+                "has_data": 0,
+                "has_peaks": 0,
+                "inframe": 0,
             }
+            for key in sorted(data[0]["knockouts"])
+        }
+        indels = collections.Counter()  # type: Counter[Tuple[str, int]]
 
-        indels = {}
+        # All statistics are collected in a single pass over the clones
         for clone in data:
-            for knockout, values in clone["knockouts"].items():
-                if values is not None:
-                    for peak in values["peaks"]:
-                        key = (knockout, peak["indel"])
-                        indels[key] = indels.get(key, 0) + 1
+            clone_knockouts = clone["knockouts"]
+            knockout_count[sum(map(bool, clone_knockouts.values()))] += 1
 
-        sorted_indels = sorted(indels.items(), key=lambda it: it[-1], reverse=True)
+            for key, knockout in clone_knockouts.items():
+                if knockout:
+                    peaks = knockout["peaks"]
+
+                    counts = knockouts.get(key)
+                    if counts is not None:
+                        counts["has_data"] += 1
+                        counts["has_peaks"] += bool(peaks)
+                        counts["inframe"] += any(
+                            abs(peak["indel"]) % 3 == 0 for peak in peaks
+                        )
+
+                    for peak in peaks:
+                        indels[(key, peak["indel"])] += 1
 
         return {
             "clones": {
@@ -277,48 +351,50 @@ class ClonesWidget(object):
                 "with_kos": knockout_count,
             },
             "knockouts": knockouts,
-            "indels": sorted_indels[:10],
+            "indels": indels.most_common(10),
         }
 
-    def _draw_clone(self, clone: Clone, row: int) -> None:
-        if any(ko["picked"] for ko in clone["knockouts"].values() if ko):
-            exported = "Y"
-        else:
-            exported = "N"
+    def _draw_clone(
+        self, clone: Clone, keys: List[str], picked_count: int, row: int
+    ) -> None:
+        exported = "Y" if picked_count else "N"
 
-        self.grid.SetCellValue(row, _COL_EXPORTED, exported)
-        self.grid.SetCellValue(row, _COL_CLONE, clone["label"])
-        self.grid.SetCellValue(row, _COL_NUM_KOS, str(_picked_count(clone)))
+        # Attributes are looked up once, since they are used for every cell
+        grid = self.grid
+        set_renderer = grid.SetCellRenderer
 
-        for idx, (label, knockout) in enumerate(sorted(clone["knockouts"].items())):
-            self.grid.SetCellValue(row + idx, _COL_KOS, label)
+        wx_set_cell_value(grid, row, _COL_EXPORTED, exported)
+        wx_set_cell_value(grid, row, _COL_CLONE, clone["label"])
+        wx_set_cell_value(grid, row, _COL_NUM_KOS, str(picked_count))
+
+        knockouts = clone["knockouts"]
+        last_row = row + len(keys) - 1
+        for cell_row, label in enumerate(keys, start=row):
+            knockout = knockouts[label]
+            wx_set_cell_value(grid, cell_row, _COL_KOS, label)
 
             inframe = False
             if knockout:
-                self.grid.SetCellValue(row + idx, _COL_INDEX, str(knockout["index"]))
-
-                indels = []
-                indels_pct = []
-                for peak in knockout["peaks"]:
-                    indels.append("%+i" % (peak["indel"],))
-                    indels_pct.append("%i" % (peak["pct"] * 100,))
-                    inframe = inframe or peak["inframe"]
-
-                self.grid.SetCellValue(row + idx, _COL_INDELS, " / ".join(indels))
-                self.grid.SetCellValue(
-                    row + idx, _COL_INDELS_PCT, " / ".join(indels_pct)
-                )
-                self.grid.SetCellValue(
-                    row + idx,
+                reads = knockout["reads"]
+                wx_set_cell_value(grid, cell_row, _COL_INDEX, str(knockout["index"]))
+
+                _, indels, indels_pct, inframe = self._format_peaks(knockout["peaks"])
+
+                wx_set_cell_value(grid, cell_row, _COL_INDELS, indels)
+                wx_set_cell_value(grid, cell_row, _COL_INDELS_PCT, indels_pct)
+                wx_set_cell_value(
+                    grid,
+                    cell_row,
                     _COL_INDELS_PCT_TOTAL,
-                    "%i" % (100 * (knockout["indel"] / knockout["reads"]),),
-                )
-                self.grid.SetCellValue(
-                    row + idx, _COL_NUM_READS, str(knockout["reads"])
+                    "%i" % (100 * (knockout["indel"] / reads),),
                 )
-                self.grid.SetCellValue(row + idx, _COL_COMMENT, knockout["comment"])
+                wx_set_cell_value(grid, cell_row, _COL_NUM_READS, str(reads))
+                wx_set_cell_value(grid, cell_row, _COL_COMMENT, knockout["comment"])
             else:
-                self.grid.SetCellValue(row + idx, _COL_INDEX, "<NA>")
+                wx_set_cell_value(grid, cell_row, _COL_INDEX, "<NA>")
+                # Clear values left by a previous draw of this row
+                for column in range(_COL_INDELS, _NUM_COLUMNS):
+                    wx_set_cell_value(grid, cell_row, column, "")
 
             if knockout and knockout["picked"]:
                 text_color = wx.BLACK
@@ -327,37 +403,54 @@ class ClonesWidget(object):
             bg_colour = wx.YELLOW if inframe else wx.WHITE
 
             for column in range(_COL_KOS, _NUM_COLUMNS):
-                self.grid.SetCellTextColour(row + idx, column, text_color)
-                self.grid.SetCellBackgroundColour(row + idx, column, bg_colour)
+                wx_set_cell_text_colour(grid, cell_row, column, text_color)
+                wx_set_cell_background_colour(grid, cell_row, column, bg_colour)
+
+            # The last row of each clone is drawn with a border below it
+            if cell_row == last_row:
+                renderer = self._border_renderer
+            else:
+                renderer = self._plain_renderer
 
             for column in range(_NUM_COLUMNS):
-                self.grid.SetCellRenderer(
-                    row + idx, column, wx.grid.GridCellStringRenderer()
-                )
+                # Renderers are shared by all cells, each of which holds a reference
+                renderer.IncRef()
+                set_renderer(cell_row, column, renderer)
+
+    def _format_peaks(self, peaks: List[Any]) -> _PeaksText:
+        # Peaks are shared between copies of a result, so the text formatted for a
+        # result can be re-used after it has been (un)picked or commented
+        cached = self._peaks_text.get(id(peaks))
+        if cached is None or cached[0] is not peaks:
+            indels = []
+            indels_pct = []
+            inframe = False
+            for peak in peaks:
+                indels.append("%+i" % (peak["indel"],))
+                indels_pct.append("%i" % (peak["pct"] * 100,))
+                inframe = inframe or peak["inframe"]
+
+            cached = (peaks, " / ".join(indels), " / ".join(indels_pct), inframe)
+            self._peaks_text[id(peaks)] = cached
 
-        row += len(clone["knockouts"]) - 1
-        for column in range(_NUM_COLUMNS):
-            self.grid.SetCellRenderer(row, column, StrRenderWithBorder())
+        return cached
 
     def _reset_grid(self, width: int, height: int) -> None:
-        current_height = self.grid.GetNumberRows()
-        if current_height > height:
-            self.grid.DeleteRows(height, current_height, True)
-        elif current_height < height:
-            self.grid.AppendRows(height - current_height)
+        self.grid.BeginBatch()
+        try:
+            current_height = self.grid.GetNumberRows()
+            if current_height > height:
+                self.grid.DeleteRows(height, current_height, True)
+            elif current_height < height:
+                self.grid.AppendRows(height - current_height)
 
-        # Prevent resizing of grids
-        for row in range(height):
-            self.grid.DisableRowResize(row)
-        self.grid.ClearGrid()
+            self.grid.ClearGrid()
+        finally:
+            self.grid.EndBatch()
 
 
-def _picked_count_key(clone: Clone) -> int:
+def _picked_count_key(clone: Clone) -> Tuple[int, List[str]]:
     picked = sorted(
         key for key, ko in clone["knockouts"].items() if ko and ko["picked"]
     )
     return (-len(picked), picked)
-
-
-def _picked_count(clone: Clone) -> int:
-    return -_picked_count_key(clone)[0]
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-from typing import Any, List
+from typing import Any, Dict, List, Optional, Tuple
 
 import wx
 
@@ -12,6 +12,10 @@ class KOMappingWidget(object):
         self._root = root
         self._state = state
         self._updating_lists = False
+        # Row of each target in the list of miSeq targets
+        self._miseq_rows = {}  # type: Dict[str, int]
+        # Targets and mappings shown in the lists, used to skip redundant refreshes
+        self._shown = None  # type: Optional[Tuple[Any, ...]]
 
         wx_bind("mapping_load", wx.EVT_BUTTON, self.OnLoadButton)
 
@@ -41,33 +45,57 @@ class KOMappingWidget(object):
         ss_targets = self._state.samplesheet_target_names()
         ss_mapping = self._state.ko_mapping
         ss_mapping_default = self._state.default_ko_mapping
-        self._build_list(self.ss_list, ss_targets, ss_mapping)
-        self._refresh_colors(self.ss_list, ss_mapping_default)
-
         miseq_targets = self._state.miseq_target_names()
-        miseq_mapping = {
-            value: key for key, value in ss_mapping.items() if value is not None
-        }
-        default_miseq_mapping = {
-            value: key for key, value in ss_mapping_default.items() if value is not None
-        }
-        self._build_list(self.miseq_list, miseq_targets, miseq_mapping)
-        self._refresh_colors(self.miseq_list, default_miseq_mapping)
-
-    def _build_list(self, widget: Any, targets: List[str], mapping: Any) -> None:
+
+        # Most refreshes are caused by changes elsewhere (e.g. picking clones)
+        shown = (ss_targets, ss_mapping, ss_mapping_default, miseq_targets)
+        if shown == self._shown:
+            return
+        self._shown = shown
+
+        # Lists are not repainted until they have been fully rebuilt and recoloured
+        self.ss_list.Freeze()
+        self.miseq_list.Freeze()
+        try:
+            self._build_list(self.ss_list, ss_targets, ss_mapping)
+            self._refresh_colors(self.ss_list, ss_mapping_default)
+
+            miseq_mapping = {
+                value: key for key, value in ss_mapping.items() if value is not None
+            }
+            default_miseq_mapping = {
+                value: key
+                for key, value in ss_mapping_default.items()
+                if value is not None
+            }
+            self._miseq_rows = self._build_list(
+                self.miseq_list, miseq_targets, miseq_mapping
+            )
+            self._refresh_colors(self.miseq_list, default_miseq_mapping)
+        finally:
+            self.miseq_list.Thaw()
+            self.ss_list.Thaw()
+
+    def _build_list(
+        self, widget: Any, targets: List[str], mapping: Any
+    ) -> Dict[str, int]:
         while widget.GetItemCount() < len(targets):
             widget.Append(["", ""])
 
         while widget.GetItemCount() > len(targets):
             widget.DeleteItem(widget.GetItemCount() - 1)
 
+        rows = {}
         for idx, value in enumerate(sorted(targets, key=str.lower)):
             widget.SetItem(idx, 0, value)
             widget.SetItem(idx, 1, mapping.get(value) or "")
+            rows[value] = idx
 
         for column in range(widget.GetColumnCount()):
             widget.SetColumnWidth(column, wx.LIST_AUTOSIZE)
 
+        return rows
+
     def _refresh_colors(self, widget: Any, default_mapping: Any) -> None:
         for row_idx in range(widget.GetItemCount()):
             key = widget.GetItemText(row_idx, 0)
@@ -102,11 +130,10 @@ class KOMappingWidget(object):
                 break
 
             if key:
-                for miseq_row in range(self.miseq_list.GetItemCount()):
-                    if self.miseq_list.GetItemText(miseq_row) == key:
-                        self.miseq_list.Select(miseq_row, True)
-                        self.miseq_list.Focus(miseq_row)
-                        break
+                miseq_row = self._miseq_rows.get(key)
+                if miseq_row is not None:
+                    self.miseq_list.Select(miseq_row, True)
+                    self.miseq_list.Focus(miseq_row)
 
         finally:
             self._updating_lists = False
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
-from typing import Any, Optional
+import operator
+
+from typing import Any, Iterator, List, NamedTuple, Optional
 
 import wx
 
@@ -13,12 +15,75 @@ _ARROW_DOWN = "▼"
 _COLUMNS = ("Index", "Sample", "Reads", "WT", "Indel", "Indel%")
 _COLUMN_WIDTH = (40, 40, 80, 80, 80, 60)
 
+# Delay before recolouring in response to the thresholds changing, during which
+# further changes are merged into a single refresh
+_COLOUR_DELAY_MS = 50
+
+# Row in the output list; values used for sorting by the Reads, WT, Indel, and
+# Indel% columns are placed at the same indices as those columns
+_Row = NamedTuple(
+    "_Row",
+    [
+        ("item_data", int),
+        ("entry", List[str]),
+        ("reads", Optional[int]),
+        ("wt", Optional[int]),
+        ("indel", Optional[int]),
+        ("ratio", Optional[float]),
+        ("inframe", bool),
+    ],
+)
+
+# Sort keys for the Index and Sample columns, which are sorted by the text shown
+_ENTRY_KEYS = {
+    0: lambda row: row.entry[0],
+    1: lambda row: row.entry[1],
+}
+
+
+class VirtualListCtrl(wx.ListCtrl):
+    # List control with the wx.LC_VIRTUAL style, for which wx only requests the text
+    # and attributes of rows that are actually shown
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        wx.ListCtrl.__init__(self, *args, **kwargs)
+        self._rows = []  # type: List[_Row]
+        self._attrs = []  # type: List[Optional[wx.ItemAttr]]
+
+    def SetRows(self, rows: List[_Row]) -> None:
+        self._rows = rows
+        self._attrs = [None] * len(rows)
+        self.SetItemCount(len(rows))
+        self.RefreshRows()
+
+    def RefreshRows(self) -> None:
+        if self._rows:
+            self.RefreshItems(0, len(self._rows) - 1)
+
+    # Item data cannot be stored in virtual list controls
+    def GetItemData(self, item: int) -> int:
+        return self._rows[item].item_data
+
+    def SetItemAttr(self, item: int, attr: wx.ItemAttr) -> None:
+        self._attrs[item] = attr
+
+    def OnGetItemText(self, item: int, column: int) -> str:
+        entry = self._rows[item].entry
+        # Rows without data have no text in the peak columns
+        return entry[column] if column < len(entry) else ""
+
+    def OnGetItemAttr(self, item: int) -> Optional[wx.ItemAttr]:
+        return self._attrs[item]
+
 
 class MiSeqOutputWidget(object):
     def __init__(self, root: "wx.App", state: State) -> None:
         self._root = root
         self._state = state
         self._last_data = None  # type: Optional[MiSeqOutput]
+        # Targets in the list box, which is assumed to initially contain placeholders
+        self._shown_targets = None  # type: Optional[List[str]]
+        self._rows = []  # type: List[_Row]
+        self._colour_timer = None  # type: Optional[wx.CallLater]
         self._sort_column = 5
         self._sort_reverse = True
 
@@ -41,6 +106,13 @@ class MiSeqOutputWidget(object):
         self._min_pct.SetValue(90)  # FIXME: Should be saved
         self._min_reads.SetValue(1000)  # FIXME: Should be saved
 
+        # Rows are drawn using a few attributes that are shared between rows
+        default_font = self._output.GetFont()
+        self._picked_attr = wx.ItemAttr(wx.BLACK, wx.LIGHT_GREY, default_font.Bold())
+        self._greyed_attr = wx.ItemAttr(wx.LIGHT_GREY, wx.WHITE, default_font)
+        self._inframe_attr = wx.ItemAttr(wx.BLACK, wx.YELLOW, default_font)
+        self._default_attr = wx.ItemAttr(wx.BLACK, wx.GREEN, default_font)
+
         self.refresh_ui()
 
     def OnColumnClick(self, event: Any) -> None:
@@ -54,7 +126,12 @@ class MiSeqOutputWidget(object):
             self._refresh_output_colours()
 
     def OnSpinBox(self, _event: Any) -> None:
-        self._refresh_output_colours()
+        if self._colour_timer is None:
+            self._colour_timer = wx.CallLater(
+                _COLOUR_DELAY_MS, self._refresh_output_colours
+            )
+        else:
+            self._colour_timer.Start(_COLOUR_DELAY_MS)
 
     def OnListBox(self, _event: Any) -> None:
         self._refresh_output()
@@ -66,8 +143,10 @@ class MiSeqOutputWidget(object):
     def OnPickItem(self, event: Any) -> None:
         knockout = self._get_selection()
         if knockout is not None:
-            self._state.miseq_toggle_picked(knockout, event.GetData())
-            self._set_item_picked(event.GetIndex())
+            row = event.GetIndex()
+            self._state.miseq_toggle_picked(knockout, self._output.GetItemData(row))
+            self._set_item_picked(knockout, row)
+            self._output.RefreshItem(row)
 
             self._last_data = self._state.miseq
             self._root.refresh_ui()
@@ -76,10 +155,10 @@ class MiSeqOutputWidget(object):
         data = self._state.miseq
 
         if data is not self._last_data:
-            self._targets.Clear()
-            if data:
-                self._targets.InsertItems(sorted(data), 0)
-                self._targets.SetSelection(0)
+            # Results may change without changing the targets, e.g. when undoing
+            targets = self._state.miseq_target_names()
+            if targets != self._shown_targets:
+                self._refresh_targets(targets)
 
             self._refresh_output()
 
@@ -87,89 +166,101 @@ class MiSeqOutputWidget(object):
 
         self._last_data = data
 
-    def _refresh_output(self) -> None:
-        self._output.ClearAll()
-        for idx, column in enumerate(_COLUMNS):
-            if idx == self._sort_column:
-                arrow = _ARROW_DOWN if self._sort_reverse else _ARROW_UP
-                column = "%s%s" % (arrow, column)
-
-            self._output.AppendColumn(column)
-            self._output.SetColumnWidth(idx, _COLUMN_WIDTH[idx])
-
-        knockout = self._get_selection()
-        if knockout is not None:
-            data = self._state.miseq[knockout]
-            num_peaks = max(
-                (len(column["peaks"]) for column in data.values()), default=0
-            )
-
-            for _ in range(num_peaks):
-                self._output.AppendColumn("Peak")
-                self._output.SetColumnWidth(self._output.GetColumnCount() - 1, 140)
-
-            for item_data, entry in self._sorted_entries(knockout):
-                self._output.Append(entry)
-                row = self._output.GetItemCount() - 1
-                self._output.SetItemData(row, item_data)
+    def _refresh_targets(self, targets: List[str]) -> None:
+        selection = self._targets.GetStringSelection()
 
-    def _sorted_entries(self, knockout: str) -> Any:
-        data = self._state.miseq[knockout]
-
-        def _sort_key(pair: Any) -> Any:
-            item_data, entry = pair
-            if self._sort_column == 0:
-                return entry[0]
-            elif self._sort_column == 1:
-                return entry[1]
-
-            if item_data < 0:
-                return float("-inf") if self._sort_reverse else float("inf")
-
-            result = data[item_data]
-            if self._sort_column == 2:
-                return result["reads"]
-            elif self._sort_column == 3:
-                return result["wt"]
-            elif self._sort_column == 4:
-                return result["indel"]
-            elif self._sort_column == 5:
-                return result["indel"] / result["reads"]
+        self._targets.Clear()
+        if targets:
+            self._targets.InsertItems(targets, 0)
+            # The selected target is kept, if it is still present
+            if selection in targets:
+                self._targets.SetSelection(targets.index(selection))
             else:
-                return item_data
-
-        entries = list(self._build_entries(knockout))
-        entries.sort(key=_sort_key, reverse=self._sort_reverse)
+                self._targets.SetSelection(0)
 
-        return entries
+        self._shown_targets = targets
 
-    def _build_entries(self, knockout: str) -> Any:
+    def _refresh_output(self) -> None:
+        # Repainting is deferred until the columns have been added
+        self._output.Freeze()
+        try:
+            self._output.ClearAll()
+            for idx, column in enumerate(_COLUMNS):
+                if idx == self._sort_column:
+                    arrow = _ARROW_DOWN if self._sort_reverse else _ARROW_UP
+                    column = "%s%s" % (arrow, column)
+
+                self._output.AppendColumn(column)
+                self._output.SetColumnWidth(idx, _COLUMN_WIDTH[idx])
+
+            rows = []  # type: List[_Row]
+            knockout = self._get_selection()
+            if knockout is not None:
+                data = self._state.miseq[knockout]
+                num_peaks = max(
+                    (len(column["peaks"]) for column in data.values()), default=0
+                )
+
+                for _ in range(num_peaks):
+                    self._output.AppendColumn("Peak")
+                    self._output.SetColumnWidth(self._output.GetColumnCount() - 1, 140)
+
+                rows = self._sorted_entries(knockout)
+
+            self._rows = rows
+            self._output.SetRows(rows)
+        finally:
+            self._output.Thaw()
+
+    def _sorted_entries(self, knockout: str) -> List[_Row]:
+        column = self._sort_column
+        rows = list(self._build_entries(knockout))
+
+        if column in (0, 1):
+            rows.sort(key=_ENTRY_KEYS[column], reverse=self._sort_reverse)
+        else:
+            # Rows without data are placed last, regardless of the sort order, so
+            # only rows with data need to be sorted by the value in the column
+            missing = [row for row in rows if row.item_data < 0]
+            rows = [row for row in rows if row.item_data > 0]
+            rows.sort(key=operator.itemgetter(column), reverse=self._sort_reverse)
+            rows.extend(missing)
+
+        return rows
+
+    def _build_entries(self, knockout: str) -> Iterator[_Row]:
         data = self._state.miseq[knockout]
         labels = self._state.samplesheet_column(knockout)
 
         for index, label in enumerate(labels, start=1):
             if label is not None:
-                if index in data:
-                    result = data[index]
-                    item_data = index
+                result = data.get(index)
+                if result is not None:
+                    reads = result["reads"]
+                    wt = result["wt"]
+                    indel = result["indel"]
+
                     entry = [
                         "%02i" % (index,),
                         label if label != str(index) else "-",
-                        str(result["reads"]),
-                        str(result["wt"]),
-                        str(result["indel"]),
-                        "%02.2f" % (100.0 * result["indel"] / result["reads"]),
+                        str(reads),
+                        str(wt),
+                        str(indel),
+                        "%02.2f" % (100.0 * indel / reads),
                     ]
 
+                    inframe = False
                     for peak in result["peaks"]:
                         if peak["inframe"]:
                             tmpl = "%+i (%.2f%%; inframe)"
+                            inframe = True
                         else:
                             tmpl = "%+i (%.2f%%)"
 
                         entry.append(tmpl % (peak["indel"], peak["pct"] * 100))
+
+                    yield _Row(index, entry, reads, wt, indel, indel / reads, inframe)
                 else:
-                    item_data = -index
                     entry = [
                         "%02i" % (index,),
                         label if label != str(index) else "-",
@@ -179,50 +270,45 @@ class MiSeqOutputWidget(object):
                         "?",
                     ]
 
-                yield (item_data, entry)
+                    yield _Row(-index, entry, None, None, None, None, False)
 
     def _refresh_output_colours(self) -> None:
-        for row in range(self._output.GetItemCount()):
-            self._set_item_picked(row)
+        if self._colour_timer is not None:
+            self._colour_timer.Stop()
 
-    def _set_item_picked(self, row: int) -> None:
         knockout = self._get_selection()
         if knockout is not None:
-            index = self._output.GetItemData(row)
-
-            default_font = self._output.GetFont()
-            bold_font = default_font.Bold()
-
-            text_font = default_font
-            text_colour = wx.BLACK
-            background_colour = wx.WHITE
-
-            if index > 0:
-                result = self._state.miseq[knockout][index]
-                min_reads = self._min_reads.GetValue()
-                min_pct = self._min_pct.GetValue()
-
-                if result["picked"]:
-                    background_colour = wx.LIGHT_GREY
-                    text_font = bold_font
-                elif (
-                    result["indel"] / result["reads"] < min_pct / 100.0
-                    or result["reads"] < min_reads
-                ):
-                    text_colour = wx.LIGHT_GREY
-                elif any(peak["inframe"] for peak in result["peaks"]):
-                    background_colour = wx.YELLOW
-                else:
-                    background_colour = wx.GREEN
+            for row in range(len(self._rows)):
+                self._set_item_picked(knockout, row)
+
+        # Rows are only redrawn once all attributes have been updated
+        self._output.RefreshRows()
+
+    def _set_item_picked(self, knockout: str, row: int) -> None:
+        # Ratios and in-frame peaks were determined when the rows were built
+        item = self._rows[row]
+        index = item.item_data
+
+        if index > 0:
+            result = self._state.miseq[knockout][index]
+            min_reads = self._min_reads.GetValue()
+            min_pct = self._min_pct.GetValue()
+
+            if result["picked"]:
+                attr = self._picked_attr
+            elif item.ratio < min_pct / 100.0 or item.reads < min_reads:
+                attr = self._greyed_attr
+            elif item.inframe:
+                attr = self._inframe_attr
             else:
-                text_colour = wx.LIGHT_GREY
+                attr = self._default_attr
+        else:
+            attr = self._greyed_attr
 
-            self._output.SetItemBackgroundColour(row, background_colour)
-            self._output.SetItemTextColour(row, text_colour)
-            self._output.SetItemFont(row, text_font)
+        self._output.SetItemAttr(row, attr)
 
     def _get_selection(self) -> Optional[str]:
-        targets = list(sorted(self._state.miseq))
+        targets = self._state.miseq_target_names()
 
         for index in self._targets.GetSelections():
             return targets[index]
@@ -5,7 +5,14 @@ from typing import Any, Iterable, Tuple
 
 import wx
 
-from common import wx_bind
+from common import (
+    wx_bind,
+    wx_find,
+    wx_set_cell_alignment,
+    wx_set_cell_background_colour,
+    wx_set_cell_text_colour,
+    wx_set_cell_value,
+)
 from state import State, SampleSheetError
 
 
@@ -17,6 +24,8 @@ class SampleSheetWidget(object):
         self.grid = wx.FindWindowByName("ss_grid")
         self.grid.CreateGrid(0, 0)
         self.grid.EnableEditing(False)
+        # Prevent resizing of rows
+        self.grid.DisableDragRowSize()
         self.grid.Bind(wx.grid.EVT_GRID_SELECT_CELL, self.OnGridSelectCell)
 
         for _, widget in self._get_radio_buttons():
@@ -50,10 +59,10 @@ class SampleSheetWidget(object):
         self._root.refresh_ui()
 
     def OnGridSelectCell(self, event: Any) -> None:
-        add_widget = wx.FindWindowByName("ss_add_verification")
+        add_widget = wx_find("ss_add_verification")
         add_enabled = False
 
-        rm_widget = wx.FindWindowByName("ss_remove_verification")
+        rm_widget = wx_find("ss_remove_verification")
         rm_enabled = False
 
         if event.Selecting:
@@ -102,32 +111,39 @@ class SampleSheetWidget(object):
         data = self._state.samplesheet
         knockouts = data["knockouts"]
 
-        self._reset_grid(data["width"], data["height"], len(data["headers"]))
-        for column, knockout in enumerate(knockouts):
-            row = 0
-            for key in data["headers"]:
-                header = knockout["headers"][key]
-
-                if not column or header != knockouts[column - 1]["headers"][key]:
-                    self.grid.SetCellValue(row, column, header)
-                row += 1
-
-            miseq = self._state.miseq.get(self._get_mapping(knockout))
-            for idx, label in enumerate(knockout["column"]):
-                self.grid.SetCellAlignment(
-                    row + idx, column, wx.ALIGN_RIGHT, wx.ALIGN_CENTRE
-                )
-
-                if miseq is not None:
-                    value = miseq.get(idx + 1, {}).get("reads", 0)
-                    self.grid.SetCellValue(row + idx, column, str(value))
-                    text_color = wx.BLACK if value or label else wx.LIGHT_GREY
-                    self.grid.SetCellTextColour(row + idx, column, text_color)
-                else:
-                    self.grid.SetCellValue(row + idx, column, "N/A")
-                    self.grid.SetCellTextColour(row + idx, column, wx.RED)
-
-        self._color_cells()
+        # Defer repainting until every cell has been updated
+        self.grid.BeginBatch()
+        try:
+            self._reset_grid(data["width"], data["height"], len(data["headers"]))
+            for column, knockout in enumerate(knockouts):
+                row = 0
+                for key in data["headers"]:
+                    header = knockout["headers"][key]
+
+                    if not column or header != knockouts[column - 1]["headers"][key]:
+                        wx_set_cell_value(self.grid, row, column, header)
+                    row += 1
+
+                miseq = self._state.miseq.get(self._get_mapping(knockout))
+                for idx, label in enumerate(knockout["column"]):
+                    wx_set_cell_alignment(
+                        self.grid, row + idx, column, wx.ALIGN_RIGHT, wx.ALIGN_CENTRE
+                    )
+
+                    if miseq is not None:
+                        value = miseq.get(idx + 1, {}).get("reads", 0)
+                        wx_set_cell_value(self.grid, row + idx, column, str(value))
+                        text_color = wx.BLACK if value or label else wx.LIGHT_GREY
+                        wx_set_cell_text_colour(
+                            self.grid, row + idx, column, text_color
+                        )
+                    else:
+                        wx_set_cell_value(self.grid, row + idx, column, "N/A")
+                        wx_set_cell_text_colour(self.grid, row + idx, column, wx.RED)
+
+            self._color_cells()
+        finally:
+            self.grid.EndBatch()
 
         for key, widget in self._get_radio_buttons():
             widget.Enable(key in data["headers"] or key == "id")
@@ -142,18 +158,20 @@ class SampleSheetWidget(object):
                 yield key, widget
 
     def _reset_verification_list(self) -> None:
-        widget = wx.FindWindowByName("ss_verifications")
-        widget.Clear()
-
         groups = set()
         data = self._state.samplesheet
         for knockout in data["knockouts"]:
-            for key, value in knockout["split"].items():
-                if value:
-                    groups.add(knockout["group"])
-
-        for key in sorted(groups):
-            widget.Append(key)
+            if any(knockout["split"].values()):
+                groups.add(knockout["group"])
+
+        widget = wx_find("ss_verifications")
+        widget.Freeze()
+        try:
+            widget.Clear()
+            for key in sorted(groups):
+                widget.Append(key)
+        finally:
+            widget.Thaw()
 
     def _reset_grid(self, width: int, height: int, n_headers: int) -> None:
         current_height = self.grid.GetNumberRows()
@@ -168,12 +186,10 @@ class SampleSheetWidget(object):
         elif current_width < width:
             self.grid.AppendCols(width - current_width)
 
-        # Prevent resizing of grids
         for row in range(height):
-            self.grid.DisableRowResize(row)
-
             label = "" if row < n_headers else str(row - n_headers + 1)
-            self.grid.SetRowLabelValue(row, label)
+            if self.grid.GetRowLabelValue(row) != label:
+                self.grid.SetRowLabelValue(row, label)
 
     def _color_cells(self) -> None:
         reds = [wx.Colour(225, 161, 169), wx.Colour(255, 191, 199)]
@@ -193,20 +209,21 @@ class SampleSheetWidget(object):
                 reds, blues, greens = reds[::-1], blues[::-1], greens[::-1]
                 last_group = knockout["group"]
 
-            for row in range(len(data["headers"])):
-                self.grid.SetCellBackgroundColour(row, column, wx.WHITE)
-
             if is_verification or data["group_by"] == "id":
-                self.grid.SetCellBackgroundColour(knockouts_row, column, blues[0])
+                header_row = knockouts_row
                 clone_colour = blues[0]
             else:
-                self.grid.SetCellBackgroundColour(group_by_row, column, greens[0])
+                header_row = group_by_row
                 clone_colour = greens[0]
 
+            for row in range(len(data["headers"])):
+                header_colour = clone_colour if row == header_row else wx.WHITE
+                wx_set_cell_background_colour(self.grid, row, column, header_colour)
+
             default_colour = reds[0]
             for row, value in enumerate(knockout["column"], start=row_offset):
-                self.grid.SetCellBackgroundColour(
-                    row, column, clone_colour if value else default_colour
+                wx_set_cell_background_colour(
+                    self.grid, row, column, clone_colour if value else default_colour
                 )
 
     def _get_mapping(self, knockout):